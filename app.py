@@ -1,14 +1,20 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import requests
+import asyncio
+import httpx
+import orjson
 import re
-from datetime import datetime, timedelta
-import uuid
+import string
+from datetime import datetime
+import itertools
 from typing import Dict, List, Any, Optional, Tuple
 import os
+import tempfile
 import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
-from section_prompts import get_section_prompts
+from section_prompts import get_section_prompts, get_combined_prompt
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -27,21 +33,213 @@ HOST = os.getenv('HOST', '0.0.0.0')
 PORT = int(os.getenv('PORT', 5000))
 TEMPERATURE = float(os.getenv('TEMPERATURE', 0.7))
 TOP_P = float(os.getenv('TOP_P', 0.9))
+# Generate all 4 branches in one LLM round-trip, falling back to the
+# per-branch calls when the combined output fails validation
+COMBINED_GENERATION = os.getenv('COMBINED_GENERATION', 'True').lower() == 'true'
+
+class OrjsonProvider(DefaultJSONProvider):
+    """orjson-backed JSON serialization for Flask responses"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 app.config['SECRET_KEY'] = SECRET_KEY
 
-# Simple in-memory storage for tests with thread safety
-tests_storage = {}
-storage_lock = threading.RLock()
+class ShardedStore:
+    """Lock-striped in-memory store for test records, keyed by test_id
+
+    Replaces a single global RLock so status polling, progress updates and
+    cleanup for different tests do not serialize behind each other; only
+    operations on ids hashing to the same shard contend.
+    """
+
+    def __init__(self, num_shards: int = 16):
+        self._shards = [{} for _ in range(num_shards)]
+        self._locks = [threading.Lock() for _ in range(num_shards)]
+        # Monotonic change counter; lets listings answer If-None-Match
+        # without re-serializing an unchanged store
+        self._version = 0
+        self._version_lock = threading.Lock()
+
+    def _bump_version(self) -> None:
+        with self._version_lock:
+            self._version += 1
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _index(self, test_id: str) -> int:
+        return hash(test_id) % len(self._shards)
+
+    def lock_for(self, test_id: str) -> threading.Lock:
+        return self._locks[self._index(test_id)]
+
+    def set(self, test_id: str, record: Dict[str, Any]) -> None:
+        with self.lock_for(test_id):
+            self._shards[self._index(test_id)][test_id] = record
+        self._bump_version()
+
+    def update(self, test_id: str, fields: Dict[str, Any]) -> bool:
+        """Merge fields into an existing record; False if the id is unknown"""
+        with self.lock_for(test_id):
+            record = self._shards[self._index(test_id)].get(test_id)
+            if record is None:
+                return False
+            record.update(fields)
+        self._bump_version()
+        return True
+
+    def peek(self, test_id: str) -> Optional[Dict[str, Any]]:
+        """Live record reference; the caller must hold lock_for(test_id)"""
+        return self._shards[self._index(test_id)].get(test_id)
+
+    def pop(self, test_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock_for(test_id):
+            record = self._shards[self._index(test_id)].pop(test_id, None)
+        if record is not None:
+            self._bump_version()
+        return record
+
+    def items_snapshot(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Copy of all (test_id, record) pairs, taken one shard at a time
+
+        Records are shallow-copied under the shard lock, so callers can
+        read or serialize them without racing concurrent update() calls.
+        """
+        items = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                items.extend(
+                    (test_id, dict(record)) for test_id, record in shard.items()
+                )
+        return items
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
 
-# Thread pool for asynchronous test generation
-executor = ThreadPoolExecutor(max_workers=3)
+# Simple in-memory storage for tests with thread safety
+tests_storage = ShardedStore()
+
+class BoundedExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that refuses work once its queue is full
+
+    The default executor queues submissions without bound, so a burst of
+    /generate requests would pile up futures (and their prompt state) until
+    memory runs out. Submission is gated by a semaphore sized to
+    max_workers + queue_size; once saturated, submit raises RuntimeError
+    and the caller can shed load immediately.
+    """
+
+    def __init__(self, max_workers: int, queue_size: int):
+        super().__init__(max_workers=max_workers)
+        self._capacity = threading.BoundedSemaphore(max_workers + queue_size)
+
+    def submit(self, fn, /, *args, **kwargs):
+        if not self._capacity.acquire(blocking=False):
+            raise RuntimeError("Executor queue is full")
+        try:
+            future = super().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._capacity.release()
+            raise
+        future.add_done_callback(lambda _: self._capacity.release())
+        return future
+
+    def queue_depth(self) -> int:
+        return self._work_queue.qsize()
+
+
+# Thread pool for asynchronous test generation, bounded so bursts are
+# rejected with 503 instead of queueing indefinitely
+EXECUTOR_QUEUE_SIZE = int(os.getenv('EXECUTOR_QUEUE_SIZE', 16))
+executor = BoundedExecutor(max_workers=3, queue_size=EXECUTOR_QUEUE_SIZE)
+
+# Dedicated event loop for LLM I/O so the pooled HTTP client keeps its
+# keep-alive connections alive across requests (generation workers submit
+# coroutines to this loop and block on the result)
+_llm_loop = asyncio.new_event_loop()
+threading.Thread(target=_llm_loop.run_forever, name="llm-io-loop", daemon=True).start()
+
+# Retry policy for transient LLM gateway errors
+LLM_RETRY_TOTAL = 3
+LLM_RETRY_BACKOFF = 0.2
+LLM_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# How many streamed characters to accumulate between progress updates
+STREAM_PROGRESS_INTERVAL = 2048
+
+# Shared async HTTP client with connection pooling for all LLM calls; the
+# transport additionally retries failed connection attempts
+llm_client = httpx.AsyncClient(
+    transport=httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=32),
+        retries=LLM_RETRY_TOTAL,
+        http2=True,
+    ),
+    timeout=httpx.Timeout(300.0),
+)
+
+def _now_iso() -> str:
+    """Current UTC time as an ISO-style string
+
+    strftime on a naive UTC datetime is cheaper than isoformat() with
+    timezone machinery, and this runs on every record create/complete.
+    """
+    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+# Test ids only need to be unique within this process (storage is
+# in-memory), so a pid-tagged counter replaces uuid4's per-request
+# os.urandom syscall; all characters stay path-safe
+_test_counter = itertools.count()
+_pid_tag = f"{os.getpid():x}"
+
+# Human-readable names for the four MSCEIT branches
+BRANCH_NAMES = {
+    "branch_1": "Perceiving Emotions",
+    "branch_2": "Using Emotions to Facilitate Thought",
+    "branch_3": "Understanding Emotions",
+    "branch_4": "Managing Emotions"
+}
 
 # Configuration for cleanup
 MAX_TEST_AGE_HOURS = 24  # Remove tests older than 24 hours
 MAX_STORED_TESTS = 100   # Maximum number of tests to keep in memory
+CLEANUP_INTERVAL_SECONDS = 300  # How often the background cleanup runs
+
+# Stop fail-fast validation after this many errors
+MAX_VALIDATION_ERRORS = 5
+
+# Pre-compiled patterns shared by cleanup, validation and saving
+_THINK_RE = re.compile(r'<think>.*?</think>', re.DOTALL)
+
+# Characters allowed in a test_id (path-safe: no separators or dots)
+_ALLOWED_TESTID_CHARS = frozenset(string.ascii_letters + string.digits + '-_')
+
+# Splits a combined-generation response back into its branch sections
+_COMBINED_SPLIT_RE = re.compile(r'\s*===BRANCH_\d===\s*\n?')
+
+# Combined token alternation for schema validation; one finditer pass over
+# the content yields every structural marker in document order
+_TOKEN_RE = re.compile(
+    r"(?P<branch>Branch\s+\d:\s+[^\n]+)"
+    r"|(?i:Question\s+(?P<qnum>\d+))"
+    r"|(?P<scenario>Scenario & Question:)"
+    r"|(?P<options>Options:)"
+    r"|^(?P<opt>[A-E])\)\s+.+"
+    r"|(?i:(?P<scores>Expert\s+Consensus\s+Scores:))"
+    r"|\b(?P<score_entry>[A-E])\s*:",
+    re.MULTILINE
+)
 
 
 class EQTestGenerator:
@@ -49,8 +247,7 @@ class EQTestGenerator:
         self.provider = provider or PROVIDER
         self.ollama_url = ollama_url or OLLAMA_BASE_URL
         self.model = model or DEEPSEEK_MODEL
-        self.session = requests.Session()
-    
+
     def _generate_test_section_by_section(self, age: int, test_id: str, provider: str = None) -> Dict[str, Any]:
         """Generate a complete EQ test section by section to avoid token limits"""
         # Use provided provider or default
@@ -71,71 +268,53 @@ class EQTestGenerator:
             "branch_1", "branch_2", "branch_3", "branch_4"
         ]
         
-        # Initialize test content
-        test_content = ""
-        
-        # Generate each section
-        for i, section_name in enumerate(section_order):
-            # Get section prompt
-            section_prompt = section_prompts[section_name]
-            
-            # Generate section content using the selected provider
+        # Try the single round-trip path first: one prompt covering all four
+        # branches, split back into sections on the delimiter markers
+        test_content = None
+        if COMBINED_GENERATION:
+            try:
+                section_results = asyncio.run_coroutine_threadsafe(
+                    self._generate_combined(age, section_order, current_provider, test_id),
+                    _llm_loop
+                ).result()
+            except Exception:
+                section_results = None  # combined call failed; use per-branch path
+            if section_results is not None:
+                candidate = self._assemble_sections(section_results, section_order)
+                is_valid, validation_details = self._validate_test_schema(candidate)
+                if is_valid:
+                    test_content = candidate
+                # An invalid combined response falls through to the
+                # per-branch path rather than failing the test outright
+
+        if test_content is None:
+            # Generate all sections concurrently on the LLM I/O loop
             try:
-                if current_provider == 'deepseek':
-                    section_content = self._call_deepseek_cloud(section_prompt)
-                else:  # default to ollama
-                    section_content = self._call_ollama(section_prompt)
+                section_results = asyncio.run_coroutine_threadsafe(
+                    self._generate_branches(section_prompts, section_order, current_provider, test_id),
+                    _llm_loop
+                ).result()
             except Exception as e:
                 return {
                     "success": False,
-                    "error": f"Failed to generate section {section_name}: {str(e)}"
-                }
-            
-            if not section_content:
-                return {
-                    "success": False,
-                    "error": f"Failed to generate section: {section_name}"
+                    "error": str(e)
                 }
-            
-            # Clean up any redacted reasoning if present
-            cleaned = re.sub(r'<think>.*?</think>', '', section_content, flags=re.DOTALL)
-            cleaned = re.sub(r'<think>.*?</think>', '', cleaned, flags=re.DOTALL)
-            
-            # Append to test content
-            test_content += cleaned + "\n\n"
-            
-            # Update progress in test record with thread safety
-            with storage_lock:
-                if test_id in tests_storage:
-                    branch_names = {
-                        "branch_1": "Perceiving Emotions",
-                        "branch_2": "Using Emotions to Facilitate Thought",
-                        "branch_3": "Understanding Emotions",
-                        "branch_4": "Managing Emotions"
-                    }
-                    branch_name = branch_names.get(section_name, section_name)
-                    tests_storage[test_id].update({
-                        "status": "generating",
-                        "progress": f"Completed branch {i+1}/{len(section_order)}: {branch_name}",
-                        "current_section": section_name,
-                        "provider": current_provider
-                    })
-        
-        # Validate complete test structure before saving
-        is_valid, validation_details = self._validate_test_schema(test_content)
+
+            test_content = self._assemble_sections(section_results, section_order)
+
+            # Validate complete test structure before saving
+            is_valid, validation_details = self._validate_test_schema(test_content)
         if not is_valid:
             error_message = "Schema validation failed"
             if validation_details:
                 error_message += f": {'; '.join(validation_details)}"
-            with storage_lock:
-                if test_id in tests_storage:
-                    tests_storage[test_id].update({
-                        "status": "failed",
-                        "progress": "validation_failed",
-                        "current_section": "validation",
-                        "error": error_message,
-                        "provider": current_provider
-                    })
+            tests_storage.update(test_id, {
+                "status": "failed",
+                "progress": "validation_failed",
+                "current_section": "validation",
+                "error": error_message,
+                "provider": current_provider
+            })
             return {
                 "success": False,
                 "test_id": test_id,
@@ -146,20 +325,17 @@ class EQTestGenerator:
         # Save complete test to file
         filepath = self._save_test_to_file(test_content, age, test_id)
         
-        # Update test record with completion and cleanup old tests
-        with storage_lock:
-            tests_storage[test_id].update({
-                "status": "completed",
-                "progress": "completed",
-                "current_section": "completed",
-                "file_path": filepath,
-                "completed_at": datetime.now().isoformat(),
-                "provider": current_provider
-            })
-            
-            # Cleanup old tests
-            self._cleanup_old_tests()
-        
+        # Update test record with completion (old tests are cleaned up by the
+        # background cleanup thread, not on the completion path)
+        tests_storage.update(test_id, {
+            "status": "completed",
+            "progress": "completed",
+            "current_section": "completed",
+            "file_path": filepath,
+            "completed_at": _now_iso(),
+            "provider": current_provider
+        })
+
         return {
             "success": True,
             "test_id": test_id,
@@ -168,59 +344,210 @@ class EQTestGenerator:
             "provider": current_provider
         }
     
-    def _call_ollama(self, prompt: str) -> str:
-        """Call Ollama API with the given prompt"""
+    async def _generate_branches(self, section_prompts: Tuple[str, ...], section_order: List[str],
+                                 current_provider: str, test_id: str) -> Dict[str, str]:
+        """Generate all branch sections concurrently, updating progress as each finishes"""
+        call = self._call_deepseek_cloud if current_provider == 'deepseek' else self._call_ollama
+
+        async def generate_section(section_name: str, section_prompt: str) -> Tuple[str, str]:
+            branch_name = BRANCH_NAMES.get(section_name, section_name)
+
+            def on_progress(received_chars: int):
+                # Streaming progress so clients see movement inside a branch
+                tests_storage.update(test_id, {
+                    "status": "generating",
+                    "progress": f"Receiving {branch_name}: {received_chars} chars",
+                    "current_section": section_name,
+                    "provider": current_provider
+                })
+
+            try:
+                section_content = await call(section_prompt, on_progress)
+            except Exception as e:
+                raise Exception(f"Failed to generate section {section_name}: {str(e)}")
+            if not section_content:
+                raise Exception(f"Failed to generate section: {section_name}")
+            return section_name, section_content
+
+        results: Dict[str, str] = {}
+        completed = 0
+        tasks = [
+            asyncio.create_task(generate_section(name, prompt))
+            for name, prompt in zip(section_order, section_prompts)
+        ]
+        try:
+            # as_completed (rather than gather) so per-branch progress updates
+            # still fire as soon as each section comes back
+            for task in asyncio.as_completed(tasks):
+                section_name, section_content = await task
+                results[section_name] = section_content
+                completed += 1
+
+                # Update progress in test record with thread safety
+                branch_name = BRANCH_NAMES.get(section_name, section_name)
+                tests_storage.update(test_id, {
+                    "status": "generating",
+                    "progress": f"Completed branch {completed}/{len(section_order)}: {branch_name}",
+                    "current_section": section_name,
+                    "provider": current_provider
+                })
+        except Exception:
+            # One failed branch invalidates the whole test, so abort the
+            # in-flight siblings instead of paying for their full latency
+            for pending in tasks:
+                pending.cancel()
+            raise
+
+        return results
+
+    def _assemble_sections(self, section_results: Dict[str, str], section_order: List[str]) -> str:
+        """Strip reasoning tags and join sections in deterministic branch order"""
+        parts = [_THINK_RE.sub('', section_results[name]) for name in section_order]
+        return "\n\n".join(parts) + "\n\n"
+
+    async def _generate_combined(self, age: int, section_order: List[str],
+                                 current_provider: str, test_id: str) -> Dict[str, str]:
+        """Generate all four branches with a single LLM round-trip
+
+        The combined prompt asks the model to delimit each branch with a
+        ===BRANCH_n=== marker; the response is split back into per-section
+        content. Raises if the response does not contain exactly one part
+        per section.
+        """
+        call = self._call_deepseek_cloud if current_provider == 'deepseek' else self._call_ollama
+
+        def on_progress(received_chars: int):
+            tests_storage.update(test_id, {
+                "status": "generating",
+                "progress": f"Receiving combined test: {received_chars} chars",
+                "current_section": "combined",
+                "provider": current_provider
+            })
+
+        response_text = await call(get_combined_prompt(age), on_progress)
+
+        # Drop anything before the first marker, then map parts onto sections
+        parts = _COMBINED_SPLIT_RE.split(response_text)[1:]
+        if len(parts) != len(section_order):
+            raise Exception(
+                f"Combined response contained {len(parts)} sections, expected {len(section_order)}"
+            )
+
+        return dict(zip(section_order, parts))
+
+    async def _stream_with_retry(self, url: str, consume, **kwargs) -> str:
+        """Open a streaming POST and hand the response to consume()
+
+        Retries with exponential backoff on 429/502/503/504 (checked before
+        any body is consumed) so a brief LLM gateway blip does not fail the
+        whole test generation.
+        """
+        for attempt in range(LLM_RETRY_TOTAL + 1):
+            async with llm_client.stream("POST", url, **kwargs) as response:
+                if response.status_code in LLM_RETRY_STATUSES and attempt < LLM_RETRY_TOTAL:
+                    pass  # fall through to the backoff below, then retry
+                else:
+                    response.raise_for_status()
+                    return await consume(response)
+            await asyncio.sleep(LLM_RETRY_BACKOFF * (2 ** attempt))
+
+    async def _call_ollama(self, prompt: str, progress_cb=None) -> str:
+        """Call Ollama API with the given prompt, streaming the response"""
         url = f"{self.ollama_url}/api/generate"
-        
+
         payload = {
             "model": self.model,
             "prompt": prompt,
-            "stream": False,
+            "stream": True,
             "options": {
                 "temperature": TEMPERATURE,
                 "top_p": TOP_P,
             }
         }
-        
-        response = self.session.post(url, json=payload, timeout=300)
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        if 'response' in result:
-            return result['response']
-        else:
-            raise Exception("Invalid response format from Ollama API")
-    
-    def _call_deepseek_cloud(self, prompt: str) -> str:
-        """Call DeepSeek Cloud API with the given prompt"""
+
+        async def consume(response: httpx.Response) -> str:
+            parts: List[str] = []
+            received = 0
+            reported = 0
+            saw_token = False
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                chunk = orjson.loads(line)
+                token = chunk.get('response')
+                if token is not None:
+                    saw_token = True
+                    parts.append(token)
+                    received += len(token)
+                    if progress_cb and received - reported >= STREAM_PROGRESS_INTERVAL:
+                        progress_cb(received)
+                        reported = received
+                if chunk.get('done'):
+                    break
+            if not saw_token:
+                raise Exception("Invalid response format from Ollama API")
+            return "".join(parts)
+
+        return await self._stream_with_retry(url, consume, json=payload)
+
+    async def _call_deepseek_cloud(self, prompt: str, progress_cb=None) -> str:
+        """Call DeepSeek Cloud API with the given prompt, streaming via SSE"""
         if not DEEPSEEK_API_KEY:
             raise Exception("DEEPSEEK_API_KEY not configured. Please set it in your environment variables.")
-        
+
         headers = {
             "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
             "Content-Type": "application/json"
         }
-        
+
         data = {
             "model": DEEPSEEK_CLOUD_MODEL,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": TEMPERATURE,
-            "top_p": TOP_P
+            "top_p": TOP_P,
+            "stream": True
         }
-        
-        response = self.session.post(DEEPSEEK_API_URL, headers=headers, json=data, timeout=300)
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        if 'choices' in result and len(result['choices']) > 0:
-            return result['choices'][0]['message']['content']
-        else:
-            raise Exception("Invalid response format from DeepSeek Cloud API")
 
-    def _validate_test_schema(self, content: str) -> Tuple[bool, List[str]]:
-        """Validate that generated test content follows the expected schema."""
+        async def consume(response: httpx.Response) -> str:
+            parts: List[str] = []
+            received = 0
+            reported = 0
+            saw_token = False
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                frame = line[len("data:"):].strip()
+                if frame == "[DONE]":
+                    break
+                chunk = orjson.loads(frame)
+                choices = chunk.get('choices') or []
+                if not choices:
+                    continue
+                token = choices[0].get('delta', {}).get('content')
+                if token:
+                    saw_token = True
+                    parts.append(token)
+                    received += len(token)
+                    if progress_cb and received - reported >= STREAM_PROGRESS_INTERVAL:
+                        progress_cb(received)
+                        reported = received
+            if not saw_token:
+                raise Exception("Invalid response format from DeepSeek Cloud API")
+            return "".join(parts)
+
+        return await self._stream_with_retry(DEEPSEEK_API_URL, consume, headers=headers, json=data)
+
+    def _validate_test_schema(self, content: str, fast_fail: bool = True) -> Tuple[bool, List[str]]:
+        """Validate that generated test content follows the expected schema.
+
+        A single finditer pass over the content feeds a small state machine,
+        instead of re-scanning every branch and question with separate
+        patterns.
+
+        With fast_fail (the production default), validation stops at the
+        first structural failure or after MAX_VALIDATION_ERRORS errors;
+        pass fast_fail=False to collect the full error list.
+        """
         errors: List[str] = []
 
         if not content or not content.strip():
@@ -233,87 +560,107 @@ class EQTestGenerator:
             "Branch 4: Managing Emotions"
         ]
 
-        branch_regex = re.compile(r"(Branch\s+\d:\s+[^\n]+)")
-        sections = branch_regex.split(content)
+        # Pass 1 (the only pass): collect the document structure
+        branches: List[Dict[str, Any]] = []
+        first_branch_start = None
 
-        # sections structure: [prefix?, header1, body1, header2, body2, ...]
-        if len(sections) < 2:
+        for match in _TOKEN_RE.finditer(content):
+            if match.group('branch'):
+                if first_branch_start is None:
+                    first_branch_start = match.start()
+                branches.append({"header": match.group('branch').strip(), "questions": []})
+                continue
+            if not branches:
+                continue  # tokens before the first branch header
+
+            questions = branches[-1]["questions"]
+            if match.group('qnum'):
+                questions.append({
+                    "number": match.group('qnum'),
+                    "has_scenario": False,
+                    "has_options_label": False,
+                    "options": [],
+                    "has_scores_label": False,
+                    "scored": set(),
+                })
+                continue
+            if not questions:
+                continue  # tokens between a branch header and its first question
+
+            question = questions[-1]
+            if match.group('scenario'):
+                question["has_scenario"] = True
+            elif match.group('options'):
+                question["has_options_label"] = True
+            elif match.group('opt'):
+                question["options"].append(match.group('opt'))
+            elif match.group('scores'):
+                question["has_scores_label"] = True
+            elif match.group('score_entry') and question["has_scores_label"]:
+                question["scored"].add(match.group('score_entry'))
+
+        if first_branch_start is None:
             return False, ["No branches found in generated content"]
 
         # Detect unexpected text before the first branch
-        preface = sections[0].strip()
-        if preface:
+        if content[:first_branch_start].strip():
             errors.append("Unexpected text found before the first branch")
 
-        branches_found = []
-        for idx in range(1, len(sections), 2):
-            header = sections[idx].strip()
-            body = sections[idx + 1] if idx + 1 < len(sections) else ""
-            branches_found.append((header, body))
-
-        if len(branches_found) != len(expected_branches):
+        if len(branches) != len(expected_branches):
             errors.append(
-                f"Expected {len(expected_branches)} branches but found {len(branches_found)}"
+                f"Expected {len(expected_branches)} branches but found {len(branches)}"
             )
+            # Structural failure: the per-branch checks below would mostly
+            # report noise, so don't bother collecting them
+            if fast_fail:
+                return False, errors
 
-        for expected_branch, branch_data in zip(expected_branches, branches_found):
-            found_header, body = branch_data
+        for expected_branch, branch in zip(expected_branches, branches):
+            if fast_fail and len(errors) >= MAX_VALIDATION_ERRORS:
+                return False, errors
 
-            if found_header != expected_branch:
-                errors.append(f"Expected branch header '{expected_branch}' but found '{found_header}'")
-
-            question_pattern = re.compile(
-                r"Question\s+(\d+)\s*(.*?)(?=(?:\nQuestion\s+\d+)|\Z)",
-                re.DOTALL | re.IGNORECASE
-            )
-            question_blocks = question_pattern.findall(body)
+            if branch["header"] != expected_branch:
+                errors.append(f"Expected branch header '{expected_branch}' but found '{branch['header']}'")
 
-            if len(question_blocks) != 3:
+            questions = branch["questions"]
+            if len(questions) != 3:
                 errors.append(
-                    f"{expected_branch}: Expected 3 questions but found {len(question_blocks)}"
+                    f"{expected_branch}: Expected 3 questions but found {len(questions)}"
                 )
                 continue
 
-            for question_number_str, question_block in question_blocks:
-                question_number = question_number_str.strip()
-                block = question_block.strip()
+            for question in questions:
+                if fast_fail and len(errors) >= MAX_VALIDATION_ERRORS:
+                    return False, errors
 
-                if "Scenario & Question:" not in block:
+                question_number = question["number"]
+
+                if not question["has_scenario"]:
                     errors.append(
                         f"{expected_branch} Question {question_number}: Missing 'Scenario & Question' section"
                     )
 
-                if "Options:" not in block:
+                if not question["has_options_label"]:
                     errors.append(
                         f"{expected_branch} Question {question_number}: Missing 'Options' section"
                     )
                     continue
 
-                options = re.findall(r"^[A-E]\)\s+.+", block, flags=re.MULTILINE)
+                options = question["options"]
                 if len(options) < 4:
                     errors.append(
                         f"{expected_branch} Question {question_number}: Expected at least 4 options but found {len(options)}"
                     )
 
-                if "Expert Consensus Scores:" not in block:
+                if not question["has_scores_label"]:
                     errors.append(
                         f"{expected_branch} Question {question_number}: Missing 'Expert Consensus Scores' section"
                     )
                 else:
-                    scores_section_match = re.search(
-                        r"Expert\s+Consensus\s+Scores:(.*?)(?:\n{2,}|\Z)",
-                        block,
-                        flags=re.DOTALL | re.IGNORECASE
-                    )
-                    scores_section = scores_section_match.group(1) if scores_section_match else ""
-                    missing_scores = []
-                    for option_line in options:
-                        option_letter = option_line.split(")", 1)[0].strip()
-                        if option_letter and option_letter not in scores_section:
-                            missing_scores.append(option_letter)
+                    missing_scores = set(options) - question["scored"]
                     if missing_scores:
                         errors.append(
-                            f"{expected_branch} Question {question_number}: Missing scores for options {', '.join(sorted(set(missing_scores)))}"
+                            f"{expected_branch} Question {question_number}: Missing scores for options {', '.join(sorted(missing_scores))}"
                         )
 
         return (len(errors) == 0, errors)
@@ -321,7 +668,7 @@ class EQTestGenerator:
     def _save_test_to_file(self, content: str, age: int, test_id: str) -> str:
         """Save test content to file with security validation"""
         # Validate test_id to prevent path traversal
-        if not re.match(r'^[a-zA-Z0-9\-_]+', test_id):
+        if not test_id or not set(test_id).issubset(_ALLOWED_TESTID_CHARS):
             raise ValueError("Invalid test_id format")
         
         # Validate age parameter
@@ -334,61 +681,89 @@ class EQTestGenerator:
         
         # Generate filename with current date and test_id for uniqueness
         current_date = datetime.now().strftime('%d_%m_%Y')
-        filename = f"{current_date}_{test_id[:8]}.txt"
+        filename = f"{current_date}_{test_id}.txt"
         filepath = os.path.join(age_dir, filename)
         
-        # Write content to file
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
+        # Write to a temp file in the same directory and rename into place,
+        # so readers never observe a partially written test
+        fd, tmp_path = tempfile.mkstemp(dir=age_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
         return filepath
     
     def _cleanup_old_tests(self):
-        """Remove old test records from memory"""
-        current_time = datetime.now()
-        cutoff_time = current_time - timedelta(hours=MAX_TEST_AGE_HOURS)
-        
-        # Remove old test records
-        old_test_ids = []
-        for test_id, test_record in tests_storage.items():
-            created_at = datetime.fromisoformat(test_record['created_at'])
-            if created_at < cutoff_time:
-                old_test_ids.append(test_id)
-        
-        for test_id in old_test_ids:
-            # Also remove the associated file if it exists
-            test_record = tests_storage.get(test_id)
-            if test_record and 'file_path' in test_record:
-                try:
-                    if os.path.exists(test_record['file_path']):
-                        os.remove(test_record['file_path'])
-                except OSError:
-                    pass  # Ignore file removal errors
-            del tests_storage[test_id]
-        
+        """Remove old test records from memory and their files on disk
+
+        Runs on the background cleanup thread. Shards are snapshotted and
+        then popped individually, so cleanup only ever contends with peers
+        on one shard at a time; victim selection and file removal happen
+        with no lock held.
+        """
+        cutoff_ts = time.time() - MAX_TEST_AGE_HOURS * 3600
+
+        snapshot = tests_storage.items_snapshot()
+
+        # Pick old test records
+        victim_ids = [
+            test_id for test_id, test_record in snapshot
+            if test_record['created_at_ts'] < cutoff_ts
+        ]
+        victims = set(victim_ids)
+
         # If we still have too many tests, remove the oldest ones
-        if len(tests_storage) > MAX_STORED_TESTS:
-            sorted_tests = sorted(
-                tests_storage.items(), 
-                key=lambda x: datetime.fromisoformat(x[1]['created_at'])
+        remaining = len(snapshot) - len(victims)
+        if remaining > MAX_STORED_TESTS:
+            survivors = sorted(
+                (item for item in snapshot if item[0] not in victims),
+                key=lambda x: x[1]['created_at_ts']
             )
-            excess_count = len(tests_storage) - MAX_STORED_TESTS
-            for i in range(excess_count):
-                test_id = sorted_tests[i][0]
-                test_record = tests_storage.get(test_id)
-                if test_record and 'file_path' in test_record:
-                    try:
-                        if os.path.exists(test_record['file_path']):
-                            os.remove(test_record['file_path'])
-                    except OSError:
-                        pass
-                del tests_storage[test_id]
+            victim_ids.extend(
+                test_id for test_id, _ in survivors[:remaining - MAX_STORED_TESTS]
+            )
+
+        if not victim_ids:
+            return
+
+        stale_paths = []
+        for test_id in victim_ids:
+            test_record = tests_storage.pop(test_id)
+            if test_record and 'file_path' in test_record:
+                stale_paths.append(test_record['file_path'])
+
+        for path in stale_paths:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                pass  # Ignore file removal errors
 
 
 # Initialize generator
 test_generator = EQTestGenerator()
 
 
+def _cleanup_loop():
+    """Periodically evict expired/excess tests off the request path"""
+    while True:
+        time.sleep(CLEANUP_INTERVAL_SECONDS)
+        try:
+            test_generator._cleanup_old_tests()
+        except Exception:
+            pass  # Keep the cleanup thread alive on unexpected errors
+
+
+threading.Thread(target=_cleanup_loop, name="test-cleanup", daemon=True).start()
+
+
 def create_error_response(message: str, status_code: int = 400) -> tuple:
     """Create standardized error response"""
     return jsonify({
@@ -412,8 +787,9 @@ def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "version": "1.0.0"
+        "timestamp": _now_iso(),
+        "version": "1.0.0",
+        "queue_depth": executor.queue_depth()
     })
 
 
@@ -439,26 +815,30 @@ def generate_test():
             return create_error_response("DEEPSEEK_API_KEY not configured. Please set it in your environment variables.", 400)
         
         # Generate unique test ID
-        test_id = str(uuid.uuid4())
+        test_id = f"{_pid_tag}-{next(_test_counter):08x}"
         
         # Create test record with thread safety
-        with storage_lock:
-            tests_storage[test_id] = {
-                "test_id": test_id,
-                "age": age,
-                "status": "generating",
-                "progress": "0/4",
-                "current_section": "initializing",
-                "provider": provider,
-                "created_at": datetime.now().isoformat()
-            }
+        tests_storage.set(test_id, {
+            "test_id": test_id,
+            "age": age,
+            "status": "generating",
+            "progress": "0/4",
+            "current_section": "initializing",
+            "provider": provider,
+            "created_at": _now_iso(),
+            "created_at_ts": time.time()
+        })
         
         # Submit generation task to thread pool
-        future = executor.submit(
-            test_generator._generate_test_section_by_section,
-            age, test_id, provider
-        )
-        
+        try:
+            future = executor.submit(
+                test_generator._generate_test_section_by_section,
+                age, test_id, provider
+            )
+        except RuntimeError:
+            tests_storage.pop(test_id)
+            return create_error_response("Server busy, please try again later", 503)
+
         return jsonify(create_success_response({
             "test_id": test_id,
             "status": "generating",
@@ -472,35 +852,86 @@ def generate_test():
 @app.route('/status/<test_id>', methods=['GET'])
 def get_test_status(test_id: str):
     """Get the status of a test generation"""
-    with storage_lock:
-        if test_id not in tests_storage:
+    # Pull just the reported fields while holding the shard lock; no
+    # full-record copy per poll
+    with tests_storage.lock_for(test_id):
+        test_record = tests_storage.peek(test_id)
+        if test_record is None:
             return jsonify({
                 "success": False,
                 "error": "Test not found"
             }), 404
-        
-        test_record = tests_storage[test_id].copy()
+
+        status = {
+            "status": test_record["status"],
+            "progress": test_record.get("progress", "unknown"),
+            "current_section": test_record.get("current_section", "unknown"),
+            "provider": test_record.get("provider", "unknown"),
+            "created_at": test_record["created_at"],
+            "completed_at": test_record.get("completed_at"),
+            "file_path": test_record.get("file_path")
+        }
+
     return jsonify({
         "success": True,
         "test_id": test_id,
-        "status": test_record["status"],
-        "progress": test_record.get("progress", "unknown"),
-        "current_section": test_record.get("current_section", "unknown"),
-        "provider": test_record.get("provider", "unknown"),
-        "created_at": test_record["created_at"],
-        "completed_at": test_record.get("completed_at"),
-        "file_path": test_record.get("file_path")
+        **status
     })
 
 
 @app.route('/tests', methods=['GET'])
 def list_tests():
-    """List all generated tests"""
-    with storage_lock:
+    """List generated tests (oldest first) with cursor pagination
+
+    Responses carry a weak ETag derived from the store's change counter,
+    so idle pollers sending If-None-Match get a 304 instead of a full
+    re-serialization of the listing.
+    """
+    etag = f'W/"{tests_storage.version}"'
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304, {'ETag': etag}
+
+    try:
+        cursor = int(request.args.get('cursor', 0))
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return create_error_response("cursor and limit must be integers", 400)
+    cursor = max(cursor, 0)
+    limit = max(1, min(limit, MAX_STORED_TESTS))
+
+    records = sorted(
+        (record for _, record in tests_storage.items_snapshot()),
+        key=lambda record: record['created_at_ts']
+    )
+    page = records[cursor:cursor + limit]
+    for record in page:
+        record.pop('created_at_ts', None)  # internal bookkeeping, not public
+    next_cursor = cursor + limit if cursor + limit < len(records) else None
+
+    response = jsonify({
+        "success": True,
+        "tests": page,
+        "next_cursor": next_cursor,
+        "total": len(records)
+    })
+    response.headers['ETag'] = etag
+    return response
+
+
+@app.route('/validate', methods=['POST'])
+def validate_content():
+    """Debug endpoint: validate test content exhaustively (no fail-fast)"""
+    try:
+        data = request.get_json()
+        content = data.get('content', '') if data else ''
+        is_valid, errors = test_generator._validate_test_schema(content, fast_fail=False)
         return jsonify({
             "success": True,
-            "tests": list(tests_storage.values())
+            "valid": is_valid,
+            "errors": errors
         })
+    except Exception as e:
+        return create_error_response(str(e), 500)
 
 
 if __name__ == '__main__':
@@ -3,31 +3,43 @@ Section-specific prompts for EQ test generation
 Each branch is generated individually to avoid token limits
 """
 
-def get_section_prompts(age: int = 15) -> dict:
-    """Get all section prompts with age placeholders replaced"""
-    age_str = str(age)
-    
-    # Determine age category for adaptation
-    if 12 <= age <= 14:
-        age_category = "12-14"
-        emotion_complexity = "clear, basic emotions (happy, sad, angry, scared, surprised)"
-        social_scenarios = "simple social scenarios (school, friends, family)"
-        tasks = "simple tasks (doing homework, making friends, playing sports)"
-        progressions = "simple progressions (sadness → crying, annoyance → anger), obvious causes"
-        scenarios = "School conflicts, peer pressure, test anxiety, friendship problems, parental conflicts"
-    else:  # 15-18
-        age_category = "15-18"
-        emotion_complexity = "complex/mixed emotions (ambivalence, nostalgia, resignation, contempt)"
-        social_scenarios = "nuanced social situations (romantic relationships, workplace, ethical dilemmas)"
-        tasks = "complex tasks (long-term planning, leadership, critical analysis, career decisions)"
-        progressions = "complex progressions (disappointment → resentment → bitterness), subtle triggers, mixed emotions"
-        scenarios = "Romantic relationships, identity issues, future anxiety, complex moral dilemmas, workplace stress"
-    
-    prompts = {
-        "branch_1": f"""
+import functools
+import hashlib
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+
+
+# Sentinel standing in for the test taker's age in the precomputed bucket
+# templates; replaced with the real digits at call time
+_AGE_SENTINEL = "\x00AGE\x00"
+
+
+def _build_prompts(age, age_category, emotion_complexity, social_scenarios,
+                   tasks, progressions, scenarios):
+    """Render the four branch prompts for one set of age-bucket parameters"""
+    # Scaffolding shared verbatim by all four branches; kept in one place so
+    # the static prefix stays identical across prompts (which also lets
+    # providers with prefix caching deduplicate it)
+    preamble = f"""
 You are an expert psychometric test designer specializing in emotional intelligence assessment for adolescents. Generate a comprehensive ability-based emotional intelligence (EQ) test section suitable for {age}-year-old test takers following these exact specifications below:
 
-Branch 1: Perceiving Emotions (3 questions)
+"""
+    # Every example scenario opens with the same age tag; format it once
+    # instead of at each of its 12 sites
+    age_tag = f"[Age {age}]"
+
+    qfmt_common = f"""For each of the 3 questions, provide:
+
+2. Question Number
+
+3. Scenario/Stimulus & Question: Clear description or scenario (age-appropriate for {age} year old). Question based on the scenario.
+
+4. 4-5 Answer Options: Multiple choice options (A, B, C, D, E)"""
+
+    prompts = {
+        "branch_1": f"""{preamble}Branch 1: Perceiving Emotions (3 questions)
 
 Skill Measured: Identifying and recognizing emotions in facial expressions, body language, tone, and situations.
 
@@ -48,13 +60,7 @@ Output Format Requirements:
 
 1. Branch Number: "Branch 1: Perceiving Emotions"
 
-For each of the 3 questions, provide:
-
-2. Question Number
-
-3. Scenario/Stimulus & Question: Clear description or scenario (age-appropriate for {age} year old). Question based on the scenario.
-
-4. 4-5 Answer Options: Multiple choice options (A, B, C, D, E)
+{qfmt_common}
 
 5. Expert Consensus Scores: An Answer-Score mapping, Assign 1-5 points to each option based on correctness 
 
@@ -65,7 +71,7 @@ Branch 1: Perceiving Emotions
 
 Question 1
 
-Scenario & Question: [Age {age}] Sarah walked into the cafeteria and saw her friend group laughing together at a table. When she approached, they suddenly stopped talking and looked at each other. One friend said, "Oh hey, Sarah," in a flat tone. Which emotions is Sarah most likely experiencing in this moment?
+Scenario & Question: {age_tag} Sarah walked into the cafeteria and saw her friend group laughing together at a table. When she approached, they suddenly stopped talking and looked at each other. One friend said, "Oh hey, Sarah," in a flat tone. Which emotions is Sarah most likely experiencing in this moment?
 
 Options:
 A) Excitement and joy
@@ -78,7 +84,7 @@ Expert Consensus Scores: A: 1, B: 5, C: 2, D: 1, E: 3
 
 Question 2
 
-Scenario & Question: [Age {age}] Look at the image of the person. Their eyebrows are pulled slightly together and upward, their mouth is turned down at the corners, and they are looking down and away. Which of the following emotions is this person most likely feeling?
+Scenario & Question: {age_tag} Look at the image of the person. Their eyebrows are pulled slightly together and upward, their mouth is turned down at the corners, and they are looking down and away. Which of the following emotions is this person most likely feeling?
 
 Options:
 A) Happiness and excitement
@@ -91,7 +97,7 @@ Expert Consensus Scores: A: 1, B: 2, C: 5, D: 3, E: 1
 
 Question 3
 
-Scenario & Question: [Age {age}] Alex spent weeks preparing a solo for the school talent show. Right after finishing the performance, the audience is silent for a moment before starting to clap. Alex walks off the stage, takes a deep breath, and says to a friend, "Well, I'm just glad it's over," while avoiding eye contact. Which emotions is Alex most likely experiencing?
+Scenario & Question: {age_tag} Alex spent weeks preparing a solo for the school talent show. Right after finishing the performance, the audience is silent for a moment before starting to clap. Alex walks off the stage, takes a deep breath, and says to a friend, "Well, I'm just glad it's over," while avoiding eye contact. Which emotions is Alex most likely experiencing?
 
 Options:
 A) Pure relief and satisfaction
@@ -103,10 +109,7 @@ E) Pride and excitement for the next opportunity
 Expert Consensus Scores: A: 2, B: 5, C: 1, D: 1, E: 3
 """,
 
-        "branch_2": f"""
-You are an expert psychometric test designer specializing in emotional intelligence assessment for adolescents. Generate a comprehensive ability-based emotional intelligence (EQ) test section suitable for {age}-year-old test takers following these exact specifications below:
-
-Branch 2: Using Emotions to Facilitate Thought (3 questions)
+        "branch_2": f"""{preamble}Branch 2: Using Emotions to Facilitate Thought (3 questions)
 
 Skill Measured: Understanding which emotions are helpful for specific tasks and using emotions strategically.
 
@@ -136,13 +139,7 @@ For each of the 3 questions, provide:
 
 1. Branch Number: "Branch 2: Using Emotions to Facilitate Thought"
 
-For each of the 3 questions, provide:
-
-2. Question Number
-
-3. Scenario/Stimulus & Question: Clear description or scenario (age-appropriate for {age} year old). Question based on the scenario.
-
-4. 4-5 Answer Options: Multiple choice options (A, B, C, D, E)
+{qfmt_common}
 
 5. Expert Consensus Scores: An Answer-Score mapping, Assign 1-5 points to each option based on correctness
 
@@ -153,7 +150,7 @@ Example Format:
 Branch 2: Using Emotions to Facilitate Thought
 Question 1
 
-Scenario & Question: [Age {age}] You have a big, open-ended project for a class where you need to come up with a completely original idea and presentation. You are in the initial "brainstorming" phase, trying to generate as many creative possibilities as you can. Which emotional state would be MOST helpful for this specific part of the task?
+Scenario & Question: {age_tag} You have a big, open-ended project for a class where you need to come up with a completely original idea and presentation. You are in the initial "brainstorming" phase, trying to generate as many creative possibilities as you can. Which emotional state would be MOST helpful for this specific part of the task?
 
 Options:
 A) Calm contentment
@@ -166,7 +163,7 @@ Expert Consensus Scores: A: 3, B: 1, C: 5, D: 2, E: 1
 
 Question 2
 
-Scenario & Question: [Age {age}] You are about to proofread your application for a summer program you really want to join. This is your final check for any small spelling, grammar, or formatting errors before you hit "submit." Which emotional state would be MOST helpful for ensuring you catch every detail?
+Scenario & Question: {age_tag} You are about to proofread your application for a summer program you really want to join. This is your final check for any small spelling, grammar, or formatting errors before you hit "submit." Which emotional state would be MOST helpful for ensuring you catch every detail?
 
 Options:
 A) Excited enthusiasm
@@ -179,7 +176,7 @@ Expert Consensus Scores: A: 2, B: 5, C: 3, D: 1, E: 1
 
 Question 3
 
-Scenario & Question: [Age {age}] You had a minor disagreement with a friend, and there's some lingering tension. You've decided to approach them to talk it out and clear the air. Your goal is to reconnect and understand their perspective. Which emotional approach would be MOST helpful in facilitating this conversation?
+Scenario & Question: {age_tag} You had a minor disagreement with a friend, and there's some lingering tension. You've decided to approach them to talk it out and clear the air. Your goal is to reconnect and understand their perspective. Which emotional approach would be MOST helpful in facilitating this conversation?
 
 Options:
 A) Defensive, to protect your own feelings
@@ -192,10 +189,7 @@ Expert Consensus Scores: A: 1, B: 5, C: 3, D: 2, E: 2
 
 """,
 
-        "branch_3": f"""
-You are an expert psychometric test designer specializing in emotional intelligence assessment for adolescents. Generate a comprehensive ability-based emotional intelligence (EQ) test section suitable for {age}-year-old test takers following these exact specifications below:
-
-Branch 3: Understanding Emotions (3 questions)
+        "branch_3": f"""{preamble}Branch 3: Understanding Emotions (3 questions)
 
 Skill Measured: Comprehending how emotions arise, evolve, and combine; understanding emotional cause-and-effect.
 
@@ -217,13 +211,7 @@ Output Format Requirements:
 
 1. Branch Number: "Branch 3: Understanding Emotions"
 
-For each of the 3 questions, provide:
-
-2. Question Number
-
-3. Scenario/Stimulus & Question: Clear description or scenario (age-appropriate for {age} year old). Question based on the scenario.
-
-4. 4-5 Answer Options: Multiple choice options (A, B, C, D, E)
+{qfmt_common}
 
 5. Expert Consensus Scores: An Answer-Score mapping, Assign 1-5 points to each option based on correctness 
 
@@ -234,7 +222,7 @@ Example Format:
 Branch 3: Understanding Emotions
 Question 1
 
-Scenario & Question: [Age {age}] Alex worked for weeks on a science fair project, putting in extra hours to make it perfect. When the results were announced, Alex did not even place in the top three. If Alex's initial feeling is one of deep disappointment, what is a LIKELY emotion that might follow if they can't process the initial feeling?
+Scenario & Question: {age_tag} Alex worked for weeks on a science fair project, putting in extra hours to make it perfect. When the results were announced, Alex did not even place in the top three. If Alex's initial feeling is one of deep disappointment, what is a LIKELY emotion that might follow if they can't process the initial feeling?
 
 Options:
 A) Gratitude for the experience
@@ -247,7 +235,7 @@ Expert Consensus Scores: A: 1, B: 5, C: 3, D: 2, E: 1
 
 Question 2
 
-Scenario & Question: [Age {age}] Jamie suddenly feels a mix of nervousness and excited anticipation, with a racing heart and butterflies in the stomach. What is the MOST likely cause of this blend of emotions?
+Scenario & Question: {age_tag} Jamie suddenly feels a mix of nervousness and excited anticipation, with a racing heart and butterflies in the stomach. What is the MOST likely cause of this blend of emotions?
 
 Options:
 A) Forgetting to do a homework assignment
@@ -260,7 +248,7 @@ Expert Consensus Scores: A: 2, B: 3, C: 5, D: 1, E: 1
 
 Question 3
 
-Scenario & Question: [Age {age}] Consider the following emotions related to anger. Which sequence shows the most accurate progression from the mildest form to the most intense?
+Scenario & Question: {age_tag} Consider the following emotions related to anger. Which sequence shows the most accurate progression from the mildest form to the most intense?
 
 Options:
 A) Rage -> Frustration -> Annoyance -> Fury
@@ -273,10 +261,7 @@ Expert Consensus Scores: A: 1, B: 5, C: 2, D: 1, E: 1
 
 """,
 
-        "branch_4": f"""
-You are an expert psychometric test designer specializing in emotional intelligence assessment for adolescents. Generate a comprehensive ability-based emotional intelligence (EQ) test section suitable for {age}-year-old test takers following these exact specifications below:
-
-Branch 4: Managing Emotions (3 questions)
+        "branch_4": f"""{preamble}Branch 4: Managing Emotions (3 questions)
 
 Skill Measured: Regulating one's own emotions and managing emotions in relationships effectively.
 
@@ -304,13 +289,7 @@ Output Format Requirements:
 
 1. Branch Number: "Branch 4: Managing Emotions"
 
-For each of the 3 questions, provide:
-
-2. Question Number
-
-3. Scenario/Stimulus & Question: Clear description or scenario (age-appropriate for {age} year old). Question based on the scenario.
-
-4. 4-5 Answer Options: Multiple choice options (A, B, C, D, E) representing different coping strategies
+{qfmt_common} representing different coping strategies
 
 5. Expert Consensus Scores: Assign 1-5 points to each option based on effectiveness
 
@@ -321,7 +300,7 @@ Example Format:
 Branch 4: Managing Emotions
 Question 1
 
-Scenario & Question: [Age {age}] Sam has an important final exam in one hour. Sam is feeling extremely anxious, with a racing mind and shaky hands. What is the MOST effective strategy for Sam to use in the next 15 minutes to manage this anxiety and get into a better headspace for the test?
+Scenario & Question: {age_tag} Sam has an important final exam in one hour. Sam is feeling extremely anxious, with a racing mind and shaky hands. What is the MOST effective strategy for Sam to use in the next 15 minutes to manage this anxiety and get into a better headspace for the test?
 
 Options:
 A) Suppress the feelings and try to think about something else entirely.
@@ -334,7 +313,7 @@ Expert Consensus Scores: A: 2, B: 5, C: 2, D: 1, E: 1
 
 Question 2
 
-Scenario & Question: [Age {age}] Taylor is furious after a teammate repeatedly dropped the ball during a crucial play, causing their team to lose the championship game. Taylor is about to confront the teammate. What is the MOST effective way for Taylor to manage this anger in the moment?
+Scenario & Question: {age_tag} Taylor is furious after a teammate repeatedly dropped the ball during a crucial play, causing their team to lose the championship game. Taylor is about to confront the teammate. What is the MOST effective way for Taylor to manage this anger in the moment?
 
 Options:
 A) Yell at the teammate immediately to release the anger.
@@ -347,7 +326,7 @@ Expert Consensus Scores: A: 1, B: 5, C: 1, D: 1, E: 1
 
 Question 3
 
-Scenario & Question: [Age {age}] Your friend Riley is visibly upset and crying after a fight with their parents. Riley says, "They never listen to me!" What is the MOST effective way for you to help Riley manage their emotions in this situation?
+Scenario & Question: {age_tag} Your friend Riley is visibly upset and crying after a fight with their parents. Riley says, "They never listen to me!" What is the MOST effective way for you to help Riley manage their emotions in this situation?
 
 Options:
 A) Tell them to calm down and that it's not a big deal.
@@ -363,3 +342,158 @@ Expert Consensus Scores: A: 1, B: 2, C: 5, D: 2, E: 1
     
     return prompts
 
+
+# Age-bucket parameters for adaptation; frozen tuples since only two
+# parameter sets ever exist (fields match _build_prompts' argument order)
+_BucketParams = namedtuple(
+    "_BucketParams",
+    ["age_category", "emotion_complexity", "social_scenarios",
+     "tasks", "progressions", "scenarios"]
+)
+
+_PARAMS_12_14 = _BucketParams(
+    age_category="12-14",
+    emotion_complexity="clear, basic emotions (happy, sad, angry, scared, surprised)",
+    social_scenarios="simple social scenarios (school, friends, family)",
+    tasks="simple tasks (doing homework, making friends, playing sports)",
+    progressions="simple progressions (sadness → crying, annoyance → anger), obvious causes",
+    scenarios="School conflicts, peer pressure, test anxiety, friendship problems, parental conflicts",
+)
+
+_PARAMS_15_18 = _BucketParams(
+    age_category="15-18",
+    emotion_complexity="complex/mixed emotions (ambivalence, nostalgia, resignation, contempt)",
+    social_scenarios="nuanced social situations (romantic relationships, workplace, ethical dilemmas)",
+    tasks="complex tasks (long-term planning, leadership, critical analysis, career decisions)",
+    progressions="complex progressions (disappointment → resentment → bitterness), subtle triggers, mixed emotions",
+    scenarios="Romantic relationships, identity issues, future anxiety, complex moral dilemmas, workplace stress",
+)
+
+
+def _split_chunks(params: _BucketParams) -> dict:
+    """Render a bucket's prompts and split them on the age sentinel
+
+    Rendering a branch at call time is then a single join with the age
+    digits as the separator (one allocation, no per-call scanning).
+    """
+    return {
+        name: tuple(text.split(_AGE_SENTINEL))
+        for name, text in _build_prompts(_AGE_SENTINEL, *params).items()
+    }
+
+
+# On-disk cache of the rendered bucket chunks, keyed on a hash of this
+# module's source so template edits invalidate it automatically; plain
+# JSON (the data is only strings) rather than pickle
+_CACHE_PATH = Path(os.path.expanduser("~/.cache/eq_test_generator")) / "prompts_v1.json"
+
+
+def _source_key() -> str:
+    try:
+        with open(__file__, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return ""
+
+
+def _load_cached_chunks(key: str):
+    try:
+        data = json.loads(_CACHE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if data.get("key") != key:
+        return None
+    try:
+        return {
+            bucket: {name: tuple(chunks) for name, chunks in prompts.items()}
+            for bucket, prompts in data["buckets"].items()
+        }
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+
+def _store_cached_chunks(key: str, buckets: dict) -> None:
+    payload = {
+        "key": key,
+        "buckets": {
+            bucket: {name: list(chunks) for name, chunks in prompts.items()}
+            for bucket, prompts in buckets.items()
+        },
+    }
+    try:
+        _CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _CACHE_PATH.write_text(json.dumps(payload), encoding="utf-8")
+    except OSError:
+        pass  # The cache is an optimization; never fail the import over it
+
+
+# Load both buckets from the disk cache when fresh, otherwise render once
+# and persist so later processes skip the warm-up formatting
+_key = _source_key()
+_cached = _load_cached_chunks(_key) if _key else None
+if _cached is not None and set(_cached) == {"12-14", "15-18"}:
+    _CHUNKS_12_14 = _cached["12-14"]
+    _CHUNKS_15_18 = _cached["15-18"]
+else:
+    _CHUNKS_12_14 = _split_chunks(_PARAMS_12_14)
+    _CHUNKS_15_18 = _split_chunks(_PARAMS_15_18)
+    if _key:
+        _store_cached_chunks(_key, {"12-14": _CHUNKS_12_14, "15-18": _CHUNKS_15_18})
+
+
+# Branch prompts for one age; tuple-backed so callers can index by branch
+# position without dict hashing, while keeping branch_N attribute access
+SectionPrompts = namedtuple(
+    "SectionPrompts", ["branch_1", "branch_2", "branch_3", "branch_4"]
+)
+
+
+@functools.lru_cache(maxsize=16)
+def get_section_prompts(age: int = 15) -> SectionPrompts:
+    """Get all section prompts with age placeholders replaced
+
+    Both age buckets are pre-split into literal chunks at import time, so
+    a call is one join per branch with the age digits as separator.
+    Results are cached per age (7 legal values) and returned as an
+    immutable SectionPrompts tuple.
+    """
+    age_str = str(age)
+    # 15-18 is the common case (and the default), so test it first
+    chunks = _CHUNKS_15_18 if age >= 15 else _CHUNKS_12_14
+    return SectionPrompts._make(
+        age_str.join(chunks[name]) for name in SectionPrompts._fields
+    )
+
+
+def get_section_prompts_many(ages) -> list:
+    """Get section prompts for a cohort of ages, aligned with input order
+
+    Formatting work is shared across the cohort: both bucket templates are
+    pre-rendered at import and per-age results are cached, so a cohort of
+    N test takers costs at most one render per distinct age rather than N.
+    """
+    return [get_section_prompts(age) for age in ages]
+
+
+@functools.lru_cache(maxsize=16)
+def get_combined_prompt(age: int = 15) -> str:
+    """Get a single prompt covering all four branches in one response
+
+    Packs the four branch instructions into one request so the whole test
+    costs one LLM round-trip; the model is asked to print a
+    ===BRANCH_n=== marker line before each branch so the caller can split
+    the response back into sections.
+    """
+    prompts = get_section_prompts(age)
+
+    pieces = [
+        "Generate all four branches of the EQ test described below in a single response. "
+        "Before each branch's output, print a line containing exactly ===BRANCH_1===, "
+        "===BRANCH_2===, ===BRANCH_3=== or ===BRANCH_4=== respectively, then follow that "
+        "branch's instructions exactly.\n"
+    ]
+    for i, prompt in enumerate(prompts, 1):
+        pieces.append(f"===BRANCH_{i}===\n{prompt}")
+
+    return "\n".join(pieces)
+
@@ -0,0 +1,9 @@
+"""WSGI entry point for running under a production server.
+
+Test storage is in-process, so run a single worker with many threads;
+generation work is I/O-bound on the LLM so threads scale fine:
+
+    gunicorn -k gthread -w 1 --threads 32 -b 0.0.0.0:5000 --timeout 360 wsgi:application
+"""
+
+from app import app as application